@@ -12,19 +12,42 @@ from mop.core.fields import (
     BoolField,
 )
 from mop.core.mopNode import MopNode
-from mop.modules import all_rig_modules
 from mop.utils.dg import find_mirror_node
+from mop.utils.undo import undoChunk
 import mop.attributes
 import mop.dag
 import mop.utils.dg as _dgutils
 import mop.metadata
 import mop.config
 
-from mop.vendor.shapeshifter import shapeshifter
-
 
 logger = logging.getLogger(__name__)
 
+# disable black formatting to keep the matrices 4x4
+# fmt: off
+_WORLD_REFLEXION_MAT = om2.MMatrix(
+    [
+        -1.0, -0.0, -0.0, 0.0,
+        0.0, 1.0, 0.0, 0.0,
+        0.0, 0.0, 1.0, 0.0,
+        0.0, 0.0, 0.0, 1.0,
+    ]
+)
+_LOCAL_REFLEXION_MAT = om2.MMatrix(
+    [
+        -1.0, 0.0, 0.0, 0.0,
+        0.0, -1.0, 0.0, 0.0,
+        0.0, 0.0, -1.0, 0.0,
+        0.0, 0.0, 0.0, 1.0,
+    ]
+)
+# fmt: on
+
+# kinds of fields, used to know how to mirror their values.
+_FIELD_KIND_VALUE = 0
+_FIELD_KIND_OBJECT = 1
+_FIELD_KIND_OBJECT_LIST = 2
+
 
 class RigModule(MopNode):
 
@@ -118,32 +141,56 @@ class RigModule(MopNode):
 
     @property
     def parent_module(self):
+        """Return the instance of the module owning the parent joint.
+
+        The instance is cached until the parent joint changes.
+        """
+        from mop.modules import all_rig_modules
+
         parent_joint = self.parent_joint.get()
-        if parent_joint:
-            parent_module = cmds.listConnections(parent_joint + ".module", source=True)[
-                0
-            ]
-            module_type = cmds.getAttr(parent_module + ".module_type")
-            parent_module = all_rig_modules[module_type](parent_module, rig=self.rig)
-            return parent_module
+        if not parent_joint:
+            return None
+
+        cached = getattr(self, "_parent_module_cache", None)
+        if cached is not None and cached[0] == parent_joint:
+            return cached[1]
+
+        parent_module = cmds.listConnections(parent_joint + ".module", source=True)[0]
+        module_type = cmds.getAttr(parent_module + ".module_type")
+        parent_module = all_rig_modules[module_type](parent_module, rig=self.rig)
+        self._parent_module_cache = (parent_joint, parent_module)
+        return parent_module
 
     @property
     def module_mirror(self):
-        """Return the actual instance of the module mirror."""
+        """Return the actual instance of the module mirror.
+
+        The instance is cached until the mirror node changes.
+        """
+        from mop.modules import all_rig_modules
+
         mirror_node = self._module_mirror.get()
-        if mirror_node:
-            mirror_module = all_rig_modules[self.module_type.get()](
-                mirror_node, rig=self.rig
-            )
-            return mirror_module
+        if not mirror_node:
+            return None
+
+        cached = getattr(self, "_module_mirror_cache", None)
+        if cached is not None and cached.node_name == mirror_node:
+            return cached
+
+        mirror_module = all_rig_modules[self.module_type.get()](
+            mirror_node, rig=self.rig
+        )
+        self._module_mirror_cache = mirror_module
+        return mirror_module
 
     @module_mirror.setter
     def module_mirror(self, value):
+        self._module_mirror_cache = None
         self._module_mirror.set(value)
 
     @property
     def is_mirrored(self):
-        return bool(self.module_mirror)
+        return bool(self._module_mirror.get())
 
     def initialize(self):
         """Creation of all the needed placement nodes.
@@ -184,62 +231,80 @@ class RigModule(MopNode):
 
     def place_guide_nodes(self):
         """Place the guide nodes based on the config."""
-        matrices = mop.config.default_guides_placement.get(self.__class__.__name__, {})
-        for i, node in enumerate(self.guide_nodes):
-            try:
-                matrix = matrices[i]
-            except Exception:
-                logger.debug("No default matrix found of {}".format(node))
-            else:
-                cmds.xform(node, matrix=matrix, worldSpace=True)
+        matrices = mop.config.default_guides_placement.get(self.__class__.__name__)
+        if not matrices:
+            return
+
+        guide_nodes = self.guide_nodes.get()
+        for node, matrix in zip(guide_nodes, matrices):
+            cmds.xform(node, matrix=matrix, worldSpace=True)
+
+        if len(matrices) < len(guide_nodes):
+            logger.warning(
+                "No default matrix found for {}".format(
+                    ", ".join(guide_nodes[len(matrices) :])
+                )
+            )
 
     def update(self):
         """Update the maya scene based on the module's fields
 
         This should ONLY be called in placement mode.
         """
+        from mop.vendor.shapeshifter import shapeshifter
+
         if self.is_built.get():
             return
 
         self.update_parent_joint()
 
+        name = self.name.get()
+        side = self.side.get()
         scene_metadata = mop.metadata.metadata_from_name(self.node_name)
-        name_changed = self.name.get() != scene_metadata["base_name"]
-        side_changed = self.side.get() != scene_metadata["side"]
+        name_changed = name != scene_metadata["base_name"]
+        side_changed = side != scene_metadata["side"]
 
         if name_changed or side_changed:
-            # rename the module node
-            new_name = self._update_node_name(self.node_name)
-            self.node_name = new_name
-
-            # rename the owned nodes
-            for node in self.owned_nodes.get():
-                self._update_node_name(node)
-
-            # rename the persistent attributes
-            persistent_attrs = cmds.listAttr(
-                self.node_name, category="persistent_attribute_backup"
-            )
-            if persistent_attrs:
-                for attr in persistent_attrs:
-                    old_node, attr_name = attr.split("__")
-
-                    metadata = mop.metadata.metadata_from_name(old_node)
-                    metadata["base_name"] = self.name.get()
-                    metadata["side"] = self.side.get()
-                    new_node = mop.metadata.name_from_metadata(metadata)
-                    logger.debug(
-                        "Renaming persistent attribute from {} to {}".format(
-                            self.node_name + "." + attr,
-                            self.node_name + "." + new_node + "__" + attr_name,
+            # group all the renames in a single undo chunk
+            with undoChunk():
+                # rename the module node
+                new_name = self._update_node_name(self.node_name, name, side)
+                self.node_name = new_name
+
+                # rename the owned nodes
+                for node in self.owned_nodes.get():
+                    self._update_node_name(node, name, side)
+
+                # rename the persistent attributes
+                persistent_attrs = cmds.listAttr(
+                    self.node_name, category="persistent_attribute_backup"
+                )
+                if persistent_attrs:
+                    attr_prefix = self.node_name + "."
+                    # a node usually has several persistent attributes,
+                    # only compute its new name once.
+                    new_nodes = {}
+                    for attr in persistent_attrs:
+                        old_node, attr_name = attr.split("__")
+
+                        new_node = new_nodes.get(old_node)
+                        if new_node is None:
+                            metadata = mop.metadata.metadata_from_name(old_node)
+                            metadata["base_name"] = name
+                            metadata["side"] = side
+                            new_node = mop.metadata.name_from_metadata(metadata)
+                            new_nodes[old_node] = new_node
+
+                        new_attr = new_node + "__" + attr_name
+                        logger.debug(
+                            "Renaming persistent attribute from {} to {}".format(
+                                attr_prefix + attr, attr_prefix + new_attr
+                            )
                         )
-                    )
-                    cmds.renameAttr(
-                        self.node_name + "." + attr, new_node + "__" + attr_name
-                    )
+                        cmds.renameAttr(attr_prefix + attr, new_attr)
         if side_changed:
-            new_color = mop.config.side_color[self.side.get()]
-            for guide in self.guide_nodes:
+            new_color = mop.config.side_color[side]
+            for guide in self.guide_nodes.get():
                 shapeshifter.change_controller_color(guide, new_color)
         self.update_guide_nodes()
         self.update_deform_joints()
@@ -250,39 +315,42 @@ class RigModule(MopNode):
 
         This lets the module's owned DAG nodes be in the same space as its deform_joints.
         """
-        # delete the old constraint
-        old_constraint_nodes = []
-
+        # delete the old constraint.
+        # Only walk the two levels created by `mop.dag.matrix_constraint`
+        # (decomposeMatrix and multMatrix), anything further upstream
+        # is the parent joint hierarchy.
         first_level_nodes = (
-            cmds.listConnections(self.node_name + ".translate", source=True) or []
+            cmds.listConnections(
+                self.node_name + ".translate",
+                source=True,
+                destination=False,
+                plugs=False,
+            )
+            or []
         )
-        old_constraint_nodes.extend(first_level_nodes)
 
-        for node in first_level_nodes:
+        if first_level_nodes:
+            # query all the second level nodes in a single call
+            plugs = [n + ".inputMatrix" for n in first_level_nodes]
             second_level_nodes = (
-                cmds.listConnections(node + ".inputMatrix", source=True) or []
+                cmds.listConnections(plugs, source=True, destination=False) or []
             )
-            old_constraint_nodes.extend(second_level_nodes)
+            cmds.delete(first_level_nodes + second_level_nodes)
 
-        if old_constraint_nodes:
-            cmds.delete(old_constraint_nodes)
-
-        guide_matrices = []
-        for guide in self.guide_nodes:
-            mat = cmds.xform(guide, query=True, matrix=True, worldSpace=True)
-            guide_matrices.append(mat)
+        guide_nodes = self.guide_nodes.get()
+        guide_matrices = mop.dag.get_world_matrices(guide_nodes)
 
         parent = self.parent_joint.get()
         if parent:
             mop.dag.matrix_constraint(parent, self.node_name)
 
-        for guide, matrix in zip(self.guide_nodes, guide_matrices):
+        for guide, matrix in zip(guide_nodes, guide_matrices):
             cmds.xform(guide, matrix=matrix, worldSpace=True)
 
-    def _update_node_name(self, node):
+    def _update_node_name(self, node, name=None, side=None):
         metadata = mop.metadata.metadata_from_name(node)
-        metadata["base_name"] = self.name.get()
-        metadata["side"] = self.side.get()
+        metadata["base_name"] = name if name is not None else self.name.get()
+        metadata["side"] = side if side is not None else self.side.get()
         new_name = mop.metadata.name_from_metadata(metadata)
         cmds.rename(node, new_name)
         return new_name
@@ -344,12 +412,12 @@ class RigModule(MopNode):
         if cmds.objExists(name):
             raise ValueError("A node with the name `{}` already exists".format(name))
 
-        node = cmds.createNode(node_type, name=name, *args, **kwargs)
         if node_type == "locator" or node_type == "follicle":
-            shape = node + "Shape"
-            cmds.rename(node, shape)
-            node = cmds.listRelatives(shape, parent=True)[0]
-            node = cmds.rename(node, name)
+            # create the transform first so the shape doesn't need renaming
+            node = cmds.createNode("transform", name=name, *args, **kwargs)
+            cmds.createNode(node_type, name=name + "Shape", parent=node)
+        else:
+            node = cmds.createNode(node_type, name=name, *args, **kwargs)
 
         cmds.addAttr(node, longName="module", attributeType="message")
         cmds.connectAttr(self.node_name + ".message", node + ".module")
@@ -366,25 +434,25 @@ class RigModule(MopNode):
         if object_id is None:
             object_id = len(self.deform_joints)
 
-        new_joint = self.add_node(
-            "joint", role="deform", object_id=object_id, description=description
-        )
-
         if not parent and self.parent_joint:
             parent = self.parent_joint.get()
         if not parent:
             parent = self.rig.skeleton_group.get()
 
-        cmds.parent(new_joint, parent)
+        # create the joint directly under its parent, its transforms are
+        # already at their default values so there is nothing to reset.
+        new_joint = self.add_node(
+            "joint",
+            role="deform",
+            object_id=object_id,
+            description=description,
+            parent=parent,
+        )
 
-        for transform in ["translate", "rotate", "scale", "jointOrient"]:
-            if transform == "scale":
-                value = 1
-            else:
-                value = 0
-            for axis in "XYZ":
-                attr = transform + axis
-                cmds.setAttr(new_joint + "." + attr, value)
+        # unlike `cmds.parent`, `createNode` doesn't connect the
+        # segment scale compensation when parenting under a joint.
+        if cmds.nodeType(parent) == "joint":
+            cmds.connectAttr(parent + ".scale", new_joint + ".inverseScale")
 
         # prevent maya from messing with the joint orient when parenting the joint
         cmds.setAttr(new_joint + ".jointOrient", lock=True)
@@ -401,6 +469,8 @@ class RigModule(MopNode):
         shape_type="circle",
     ):
         """Creates a new guide node for this module."""
+        from mop.vendor.shapeshifter import shapeshifter
+
         if not skip_id and object_id is None:
             object_id = len(self.guide_nodes)
 
@@ -436,6 +506,8 @@ class RigModule(MopNode):
     def add_control(
         self, dag_node, object_id=None, description=None, shape_type="circle"
     ):
+        from mop.vendor.shapeshifter import shapeshifter
+
         metadata = mop.metadata.metadata_from_name(dag_node)
         if object_id is not None:
             metadata["id"] = object_id
@@ -446,17 +518,18 @@ class RigModule(MopNode):
 
         ctl = shapeshifter.create_controller_from_name(shape_type)
         ctl = cmds.rename(ctl, ctl_name)
-        color = mop.config.side_color[self.side.get()]
-        shapeshifter.change_controller_color(ctl, color)
 
-        # get the existing shape data if it exists
+        # get the existing shape data if it exists, it already holds the color
+        # so only fall back to the side color when there is no saved shape.
         mop.attributes.create_persistent_attribute(
             ctl, self.node_name, longName="shape_data", dataType="string"
         )
         ctl_data = cmds.getAttr(ctl + ".shape_data")
         if ctl_data:
-            ctl_data = json.loads(ctl_data)
-            shapeshifter.change_controller_shape(ctl, ctl_data)
+            shapeshifter.change_controller_shape(ctl, json.loads(ctl_data))
+        else:
+            color = mop.config.side_color[self.side.get()]
+            shapeshifter.change_controller_color(ctl, color)
 
         mop.attributes.create_persistent_attribute(
             ctl, self.node_name, longName="attributes_state", dataType="string"
@@ -497,85 +570,87 @@ class RigModule(MopNode):
         """
         raise NotImplementedError
 
-    def find_non_mirrored_parents(self, non_mirrored_parents=None):
-        """Recursively find the parent module that are not mirrored."""
-
-        if non_mirrored_parents is None:
-            non_mirrored_parents = []
+    def find_non_mirrored_parents(self):
+        """Find the parent modules that are not mirrored."""
+        non_mirrored_parents = []
 
         parent = self.parent_module
-
-        if not parent.module_mirror and parent.side.get() != "M":
+        while (
+            parent is not None
+            and not parent.module_mirror
+            and parent.side.get() != "M"
+        ):
             non_mirrored_parents.append(parent)
-            RigModule.find_non_mirrored_parents(parent, non_mirrored_parents)
+            parent = parent.parent_module
 
         return non_mirrored_parents
 
-    def update_mirror(self):
+    @classmethod
+    def _mirror_field_plan(cls):
+        """Return the ``(name, kind)`` of the fields to copy when mirroring.
 
-        # update all the fields to match the mirror module
-        for field in self.module_mirror.fields:
-            if field.name in ["name", "side"]:
-                continue
-            if field.editable:
-                value = None
+        The plan only depends on the class fields, so it is computed once
+        per class and stored on it.
+        """
+        plan = cls.__dict__.get("_mirror_fields")
+        if plan is None:
+            plan = []
+            for field in cls.fields:
+                if field.name in ["name", "side"] or not field.editable:
+                    continue
                 if isinstance(field, ObjectField):
-                    orig_value = getattr(self.module_mirror, field.name).get()
-                    value = find_mirror_node(orig_value)
+                    kind = _FIELD_KIND_OBJECT
                 elif isinstance(field, ObjectListField):
-                    orig_value = getattr(self.module_mirror, field.name).get()
-                    value = [find_mirror_node(v) for v in orig_value]
+                    kind = _FIELD_KIND_OBJECT_LIST
                 else:
-                    value = getattr(self.module_mirror, field.name).get()
+                    kind = _FIELD_KIND_VALUE
+                plan.append((field.name, kind))
+            plan = tuple(plan)
+            cls._mirror_fields = plan
+        return plan
 
-                if value:
-                    getattr(self, field.name).set(value)
+    def update_mirror(self):
+        module_mirror = self.module_mirror
+
+        # update all the fields to match the mirror module
+        for name, kind in module_mirror._mirror_field_plan():
+            value = getattr(module_mirror, name).get()
+            if kind == _FIELD_KIND_OBJECT:
+                value = find_mirror_node(value)
+            elif kind == _FIELD_KIND_OBJECT_LIST:
+                value = [find_mirror_node(v) for v in value]
+
+            # only set the fields that changed, setting an ObjectListField
+            # clears and reconnects the whole multi attribute.
+            if value and getattr(self, name).get() != value:
+                getattr(self, name).set(value)
 
         self.update()
 
         # mirror the nodes based on the mirror type
-        mirror_type = self.mirror_type.get()
-        for orig_node, new_node in zip(
-            self.module_mirror.guide_nodes, self.guide_nodes
-        ):
-            if mirror_type.lower() == "behavior":
-                # disable black formatting to keep the matrices 4x4
-                # fmt: off
-                world_reflexion_mat = om2.MMatrix(
-                    [
-                        -1.0, -0.0, -0.0, 0.0,
-                        0.0, 1.0, 0.0, 0.0,
-                        0.0, 0.0, 1.0, 0.0,
-                        0.0, 0.0, 0.0, 1.0,
-                    ]
-                )
-                local_reflexion_mat = om2.MMatrix(
-                    [
-                        -1.0, 0.0, 0.0, 0.0,
-                        0.0, -1.0, 0.0, 0.0,
-                        0.0, 0.0, -1.0, 0.0,
-                        0.0, 0.0, 0.0, 1.0,
-                    ]
-                )
-                # fmt: on
-                orig_node_mat = om2.MMatrix(cmds.getAttr(orig_node + ".worldMatrix"))
-                new_mat = local_reflexion_mat * orig_node_mat * world_reflexion_mat
+        mirror_type = self.mirror_type.get().lower()
+        orig_nodes = module_mirror.guide_nodes.get()
+
+        orig_mats = mop.dag.get_world_matrices(orig_nodes)
+        new_nodes = self.guide_nodes.get()
+        for orig_node_mat, new_node in zip(orig_mats, new_nodes):
+            # guides can be nested, moving one moves the next ones
+            # so their current matrix has to be read just before comparing.
+            current_mat = mop.dag.get_world_matrices([new_node])[0]
+            if mirror_type == "behavior":
+                new_mat = _LOCAL_REFLEXION_MAT * orig_node_mat * _WORLD_REFLEXION_MAT
+                if current_mat.isEquivalent(new_mat):
+                    continue
                 cmds.xform(new_node, matrix=new_mat, worldSpace=True)
-            if mirror_type.lower() == "orientation":
-                # disable black formatting to keep the matrices 4x4
-                # fmt: off
-                world_reflexion_mat = om2.MMatrix(
-                    [
-                        -1.0, -0.0, -0.0, 0.0,
-                        0.0, 1.0, 0.0, 0.0,
-                        0.0, 0.0, 1.0, 0.0,
-                        0.0, 0.0, 0.0, 1.0,
-                    ]
-                )
-                # fmt: on
-                orig_node_mat = om2.MMatrix(cmds.getAttr(orig_node + ".worldMatrix"))
-                new_mat = orig_node_mat * world_reflexion_mat
+            if mirror_type == "orientation":
+                # keep the orientation of the original node
+                # and only mirror its position across the YZ plane.
+                new_xform = om2.MTransformationMatrix(orig_node_mat)
+                translation = new_xform.translation(om2.MSpace.kWorld)
+                translation.x = -translation.x
+                new_xform.setTranslation(translation, om2.MSpace.kWorld)
+                new_mat = new_xform.asMatrix()
+                if current_mat.isEquivalent(new_mat):
+                    continue
                 cmds.xform(new_node, matrix=new_mat, worldSpace=True)
                 cmds.setAttr(new_node + ".scale", 1, 1, 1)
-                orig_orient = cmds.xform(orig_node, q=True, rotation=True, ws=True)
-                cmds.xform(new_node, rotation=orig_orient, ws=True)
@@ -1,6 +1,8 @@
 import imp
 import logging
 import os
+import re
+import sys
 
 import config
 import maya.cmds as cmds
@@ -31,9 +33,11 @@ def run_scripts(step):
 def run_scripts_from_path(scripts_path):
     if os.path.isdir(scripts_path):
         for script_name in os.listdir(scripts_path):
-            module_name = os.path.splitext(script_name)[0]
+            module_name, ext = os.path.splitext(script_name)
+            if ext != ".py":
+                continue
             script_path = os.path.join(scripts_path, script_name)
-            mod = imp.load_source(module_name, script_path)
+            mod = load_script(script_path)
 
             asset_type = config.get_asset_type()
 
@@ -47,6 +51,22 @@ def run_scripts_from_path(scripts_path):
                 mod.run()
 
 
+def load_script(script_path):
+    """Load the script at ``script_path``.
+
+    Each script is loaded under a name derived from its path and kept out
+    of ``sys.modules``, so scripts with the same file name in different
+    directories don't share a module.
+    """
+    module_name = "mop_custom_script_" + re.sub(
+        r"\W", "_", os.path.abspath(script_path)
+    )
+    try:
+        return imp.load_source(module_name, script_path)
+    finally:
+        sys.modules.pop(module_name, None)
+
+
 def get_scripts_dir(level="asset"):
     dir_data = getattr(config, level + "_scripts_dir")
     if dir_data is None:
@@ -1,4 +1,5 @@
 import maya.cmds as cmds
+import maya.api.OpenMaya as om2
 import mop.metadata
 import mop.utils.dg as _dgutils
 
@@ -151,6 +152,22 @@ def snap_first_to_last(source, target):
     cmds.xform(source, matrix=targ_mat, worldSpace=True)
 
 
+def get_world_matrices(nodes):
+    """Get the world matrices of the given DAG nodes.
+
+    All the nodes are added to a single ``MSelectionList`` and their
+    matrices are read from the API, which avoids one getAttr per node.
+
+    :param nodes: names of the DAG nodes.
+    :type nodes: list
+    :rtype: list of om2.MMatrix
+    """
+    sel = om2.MSelectionList()
+    for node in nodes:
+        sel.add(node)
+    return [sel.getDagPath(i).inclusiveMatrix() for i in range(len(nodes))]
+
+
 def reset_node(node):
     for attribute in ["translate", "rotate", "scale"]:
         for axis in "XYZ":
@@ -3,6 +3,11 @@ import maya.cmds as cmds
 import mop.utils.case
 
 
+# cache of the metadata parsed by `metadata_from_name`, keyed by node name.
+_metadata_cache = {}
+_metadata_cache_size = 4096
+
+
 def name_from_metadata(metadata):
     """Generate a node name from the given metadata.
 
@@ -21,6 +26,21 @@ def name_from_metadata(metadata):
 
 
 def metadata_from_name(name):
+    """Get the metadata of a node name.
+
+    The parsed metadata is cached per name, a copy is returned
+    so the callers can freely edit it.
+    """
+    data = _metadata_cache.get(name)
+    if data is None:
+        data = _parse_name(name)
+        if len(_metadata_cache) >= _metadata_cache_size:
+            _metadata_cache.clear()
+        _metadata_cache[name] = data
+    return data.copy()
+
+
+def _parse_name(name):
     data = {}
     split_name = name.split("_")
 
@@ -8,8 +8,10 @@ import maya.cmds as cmds
 def undoChunk():
     """Code block will execute in one undo chunk."""
     cmds.undoInfo(openChunk=True)
-    yield
-    cmds.undoInfo(closeChunk=True)
+    try:
+        yield
+    finally:
+        cmds.undoInfo(closeChunk=True)
 
 
 def undoable(func):